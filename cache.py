@@ -0,0 +1,37 @@
+"""On-disk cache of Gemini results and uploads, so reruns don't pay for the same call twice."""
+import hashlib
+import os
+import shelve
+import threading
+
+
+def cache_key(audio_url, prompt):
+    """Key for one (audio, prompt) pair; changes whenever the prompt does."""
+    return hashlib.sha256((audio_url + prompt).encode()).hexdigest()
+
+
+def upload_key(audio_url):
+    """Key for the name of the Gemini file a recording was uploaded as."""
+    return "upload:" + hashlib.sha256(audio_url.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe wrapper around a shelve file."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = shelve.open(path)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._db.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._db[key] = value
+            self._db.sync()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
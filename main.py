@@ -1,192 +1,646 @@
 import os
+import io
 import time
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import tempfile
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+from pydantic import BaseModel, ValidationError, model_validator
+
+from cache import ResponseCache, cache_key, upload_key
+from ratelimit import RateLimiter
 
 # --- CONFIGURATION ---
 GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
 SLACK_WEBHOOK_URL = os.environ["SLACK_WEBHOOK_URL"]
 SPREADSHEET_ID = os.environ["SPREADSHEET_ID"]
 GOOGLE_CREDS_JSON = os.environ["GOOGLE_CREDS_JSON"] 
+MAX_WORKERS = max(1, int(os.environ.get("MAX_WORKERS", "8")))  # Calls processed concurrently
+UPDATE_BATCH_SIZE = 50  # Buffered row writes per Sheets batchUpdate
+FILE_PROCESSING_TIMEOUT = 120  # Seconds to wait for Gemini to process an upload
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+AUDIO_SPOOL_SIZE = 32 * 1024 * 1024  # Downloads above this spill to disk when ffmpeg is missing
+SLACK_MAX_BLOCKS = 50  # Slack rejects messages with more blocks than this
+FFMPEG = shutil.which("ffmpeg")  # Audio is compressed before upload when available
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", ".cache/responses")
+BOOKMARK_HINT_PATH = os.environ.get("BOOKMARK_HINT_PATH", ".cache/bookmark")
+
+GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_MODELS = [GEMINI_MODEL, "gemini-1.5-pro"]  # Pro is only used if flash keeps returning bad replies
+GEMINI_RPM = {GEMINI_MODEL: 15, "gemini-1.5-pro": 2}  # Requests per minute, per model
+JSON_ATTEMPTS_PER_MODEL = 2  # Unparseable replies retried before falling back
+
+PROMPT_ANALYSIS = """
+I am an Insurance Analyst. Listen to this Tamil sales call.
+Task 1: Transcribe the key conversation points (Summary Transcript) in English.
+Task 2: Identify the specific customer pain point.
+Task 3: Score this call (0-10) on 'Viral Marketing Potential'.
+Task 4: Only if the score is 6 or more, create a Social Media Carousel (3 Slides)
+in ENGLISH and TAMIL about this pain point, and 3 different catchy Hooks.
+These are required for such calls. For lower scores, return empty lists for these.
+"""
+
+# Gemini is constrained to reply with exactly this JSON shape, and replies
+# are validated against it before use
+class Analysis(BaseModel):
+    transcript_summary: str
+    pain_point: str
+    score: int
+    hooks: list[str]
+    english_slides: list[str]
+    tamil_slides: list[str]
+
+    @model_validator(mode="after")
+    def posts_for_high_scores(self):
+        # The schema can't make the posts conditionally required, so a
+        # high-scoring reply without them is rejected here and asked again.
+        if self.score >= 6 and not (self.hooks and self.english_slides and self.tamil_slides):
+            raise ValueError("score is 6 or more but the posts are missing")
+        return self
 
 # Initialize the NEW Google GenAI Client
-client = genai.Client(api_key=GEMINI_API_KEY)
+# 429s (quota exhausted) are retried with exponential backoff by the SDK
+client = genai.Client(
+    api_key=GEMINI_API_KEY,
+    http_options=types.HttpOptions(
+        retry_options=types.HttpRetryOptions(
+            attempts=6, initial_delay=1.0, max_delay=30.0, http_status_codes=[429]
+        )
+    )
+)
+
+# Paces generate_content per model, since each has its own requests-per-minute quota
+_rate_limiters = {model: RateLimiter(rpm) for model, rpm in GEMINI_RPM.items()}
+
+# Models the API reported as not found; later calls skip them
+_missing_models = set()
+
+# Cleared once Gemini rejects an audio URL; later calls upload instead
+_direct_urls_ok = True
+
+# Slack messages waiting for flush_slack()
+_slack_queue = []
+
+# Gemini analyses from previous runs, keyed by audio URL + prompt
+response_cache = ResponseCache(RESPONSE_CACHE_PATH)
+
+# Shared HTTP session: keeps TLS connections to Slack and the audio host
+# alive across calls and retries rate limits / transient server errors.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=max(32, MAX_WORKERS),  # One connection per worker and host
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+    ),
+))
+# A Slack post that fails with a 5xx may still have been delivered, so only
+# retry the webhook when Slack says it was rate limited.
+session.mount(SLACK_WEBHOOK_URL, HTTPAdapter(
+    max_retries=Retry(
+        total=5,
+        read=0,
+        backoff_factor=0.5,
+        status_forcelist=[429],
+        allowed_methods=["POST"],
+    ),
+))
 
 # --- GOOGLE SHEETS SETUP ---
-creds_dict = json.loads(GOOGLE_CREDS_JSON)
+creds_dict = orjson.loads(GOOGLE_CREDS_JSON)
 creds = service_account.Credentials.from_service_account_info(
     creds_dict, scopes=['https://www.googleapis.com/auth/spreadsheets']
 )
-service = build('sheets', 'v4', credentials=creds)
+# Static discovery uses the Sheets API description bundled with the client
+# library instead of fetching it over HTTP on every start.
+service = build('sheets', 'v4', credentials=creds, static_discovery=True, cache_discovery=False)
 
-def send_slack_msg(blocks):
-    """Helper to send valid Slack messages."""
+def post_slack(blocks):
+    """Helper to send valid Slack messages.
+
+    Returns Slack's response, or None if the request itself failed.
+    """
     try:
-        requests.post(SLACK_WEBHOOK_URL, json={"blocks": blocks})
+        resp = session.post(
+            SLACK_WEBHOOK_URL,
+            data=orjson.dumps({"blocks": blocks}),
+            headers={"Content-Type": "application/json"}
+        )
     except Exception as e:
         print(f"Slack Error: {e}")
+        return None
+    if not resp.ok:
+        print(f"Slack Error: {resp.status_code} {resp.text}")
+    return resp
+
+def send_slack_msg(blocks):
+    """Queues a Slack message; flush_slack() sends everything queued."""
+    _slack_queue.append(blocks)
+
+def flush_slack():
+    """Sends queued messages, packed into as few Slack posts as the block limit allows.
+
+    If Slack rejects a packed post as invalid, its messages are sent one at a
+    time, so one bad message doesn't take the others down with it.
+    """
+    groups = []
+    size = 0
+    for blocks in _slack_queue:
+        if groups and size + 1 + len(blocks) <= SLACK_MAX_BLOCKS:
+            groups[-1].append(blocks)
+            size += 1 + len(blocks)
+        else:
+            groups.append([blocks])
+            size = len(blocks)
+
+    for group in groups:
+        batch = list(group[0])
+        for blocks in group[1:]:
+            batch.append({"type": "divider"})
+            batch.extend(blocks)
+        resp = post_slack(batch)
+        # Only a 400 means the payload was refused; after other errors
+        # the post may have gone through, and resending would repeat it.
+        if resp is not None and resp.status_code == 400 and len(group) > 1:
+            print("Posting the messages one at a time instead...")
+            for blocks in group:
+                post_slack(blocks)
+    _slack_queue.clear()
+
+def parse_settings(rows):
+    """Returns (posts per run, last row already dealt with) from Settings!B1:B2.
+
+    Posts per run default to 2. Settings!B2 is the bookmark; blank or 0
+    means scan every row. Each cell falls back to its default on its own.
+    """
+    try:
+        target_posts = int(rows[0][0])
+    except (IndexError, ValueError):
+        target_posts = 2
+    try:
+        last_row = int(rows[1][0])
+    except (IndexError, ValueError):
+        last_row = 0
+    return target_posts, last_row
+
+def parse_pending_calls(rows, first_row=1):
+    """Picks the long Pending calls out of Calls sheet rows starting at `first_row`."""
+    pending = []
+    for i, row in enumerate(rows, start=first_row):
+        if len(row) <= 3 or row[3] != "Pending":
+            continue
+        try:
+            duration = float(row[2])
+        except (ValueError, TypeError):
+            continue  # Blank or non-numeric duration
+        if duration > 300:
+            pending.append({"row": i, "url": row[1]})
+    return pending
+
+def first_open_row(rows, first_row=1):
+    """Returns the first of `rows` that isn't settled yet, or None.
+
+    A row is open while its status is blank, or while it is Pending without
+    a usable duration: it may still be being filled in. Rows with any other
+    status are settled, and so are short Pending calls, which are never
+    processed. Long Pending calls are tracked separately, as pending calls.
+    """
+    for i, row in enumerate(rows, start=first_row):
+        if len(row) <= 3 or not row[3]:
+            return i
+        if row[3] == "Pending":
+            try:
+                float(row[2])
+            except (ValueError, TypeError):
+                return i
+    return None
+
+def read_bookmark_hint():
+    """Returns the bookmark this bot last wrote to Settings!B2, or 0."""
+    try:
+        with open(BOOKMARK_HINT_PATH) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 0
+
+def write_bookmark_hint(row):
+    os.makedirs(os.path.dirname(BOOKMARK_HINT_PATH) or ".", exist_ok=True)
+    with open(BOOKMARK_HINT_PATH, "w") as f:
+        f.write(str(row))
 
-def get_settings():
+def load_sheet_state():
+    """Reads the settings and the new Calls rows in a single batchGet.
+
+    The Calls range should start after the Settings!B2 bookmark, which is
+    only known once the response arrives, so it starts after the bookmark
+    this bot last wrote instead. Rows behind the real bookmark are dropped;
+    if the real bookmark is further back (e.g. it was reset), the missing
+    rows are fetched with a second request.
+
+    Returns (posts per run, bookmark, pending calls, last settled row), where
+    the last settled row is the one before the first open row after the
+    bookmark (see first_open_row()), or the last row fetched.
+    """
+    hint = read_bookmark_hint()
     try:
-        result = service.spreadsheets().values().get(
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=SPREADSHEET_ID, ranges=["Settings!B1:B2", f"Calls!A{hint + 1}:D"]
+        ).execute()
+        settings, calls = result.get('valueRanges', [{}, {}])
+    except HttpError as e:
+        # The hint is the sheet's last row, so the Calls range starts past
+        # the end of the grid: there are no new rows.
+        if e.resp.status != 400 or "exceeds grid limits" not in str(e):
+            raise
+        settings = service.spreadsheets().values().get(
             spreadsheetId=SPREADSHEET_ID, range="Settings!B1:B2"
         ).execute()
-        rows = result.get('values', [])
-        return int(rows[0][0]) if rows else 2
-    except:
-        return 2
-
-def get_pending_calls():
-    result = service.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID, range="Calls!A:D"
-    ).execute()
-    rows = result.get('values', [])
-    pending = []
-    for i, row in enumerate(rows):
-        if len(row) > 3 and row[3] == "Pending":
+        calls = {}
+    target_posts, last_row = parse_settings(settings.get('values', []))
+
+    first_row = hint + 1
+    rows = calls.get('values', [])
+    if last_row < hint:
+        first_row = last_row + 1
+        rows = service.spreadsheets().values().get(
+            spreadsheetId=SPREADSHEET_ID, range=f"Calls!A{first_row}:D"
+        ).execute().get('values', [])
+
+    last_settled = first_row + len(rows) - 1
+    first_new = max(first_row, last_row + 1)
+    rows = rows[first_new - first_row:]
+    open_row = first_open_row(rows, first_new)
+    if open_row is not None:
+        last_settled = open_row - 1
+    return target_posts, last_row, parse_pending_calls(rows, first_new), last_settled
+
+def bookmark_update(calls, done_rows, last_row, last_settled):
+    """Builds the Settings!B2 write that lets the next run skip finished rows.
+
+    The bookmark moves up to the first call still left Pending, but never
+    past `last_settled`, so rows not filled in yet are read again next run.
+    Returns None if the bookmark would not move.
+    """
+    unfinished = [call['row'] - 1 for call in calls if call['row'] not in done_rows]
+    bookmark = min(unfinished + [last_settled])
+    if bookmark <= last_row:
+        return None
+    return {"range": "Settings!B2", "values": [[bookmark]]}
+
+def generate_json(parts, prompt, schema, models=GEMINI_MODELS):
+    """Sends `parts` + `prompt` to Gemini and returns its reply, parsed.
+
+    The reply is forced to be JSON matching `schema`, a pydantic model, and is
+    returned as a validated dict. A reply that fails validation is asked for
+    again, and only after JSON_ATTEMPTS_PER_MODEL bad replies does the next
+    of `models` get a turn. API errors are raised as they are (the
+    SDK has already retried 429s), so a brief outage never pushes calls onto
+    the slower model. The exception is a model the API doesn't have (404):
+    that won't change mid-run, so it is skipped for the rest of the run.
+    """
+    contents = parts + [prompt]
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema
+    )
+
+    error = None
+    for model in [m for m in models if m not in _missing_models] or models:
+        for attempt in range(JSON_ATTEMPTS_PER_MODEL):
             try:
-                # Default to 600s if duration missing, to ensure we process it
-                duration = float(row[2]) if len(row) > 2 else 600
-                if duration > 300:
-                    pending.append({"row": i + 1, "url": row[1]})
-            except:
-                pass 
-    return pending
+                with _rate_limiters[model]:
+                    response = client.models.generate_content(model=model, contents=contents, config=config)
+            except errors.ClientError as e:
+                if e.code != 404:
+                    raise
+                print(f"{model} is not available, skipping it from now on: {e}")
+                _missing_models.add(model)
+                error = e
+                break
+            try:
+                return schema.model_validate_json(response.text).model_dump()
+            except ValidationError as e:
+                print(f"{model} returned an invalid reply (attempt {attempt + 1}): {e}")
+                error = e
+
+    raise error
+
+def transcode_to_opus(resp):
+    """Pipes a streamed download through ffmpeg into a 16 kbit/s mono Opus stream.
+
+    Returns the Ogg/Opus data as a BytesIO; an hour of speech is about 7 MB.
+    """
+    feed_errors = []
+
+    with subprocess.Popen(
+        [FFMPEG, "-loglevel", "error", "-i", "pipe:0",
+         "-ac", "1", "-c:a", "libopus", "-b:a", "16k", "-f", "ogg", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    ) as proc:
+        def feed():
+            # Runs alongside the read below so neither pipe can fill up and stall.
+            try:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    proc.stdin.write(chunk)
+            except BrokenPipeError:
+                pass  # ffmpeg stopped reading; its exit status says why
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        feeder = threading.Thread(target=feed)
+        feeder.start()
+        try:
+            data = proc.stdout.read()
+            proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            feeder.join()
+
+    if feed_errors:
+        raise feed_errors[0]
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {proc.returncode}")
+    return io.BytesIO(data)
+
+def wait_for_file(file_ref, timeout=FILE_PROCESSING_TIMEOUT):
+    """Polls an uploaded file until it leaves PROCESSING, backing off exponentially.
+
+    Returns the last seen file; its state is still PROCESSING if the timeout hit.
+    """
+    delay = 0.25
+    deadline = time.time() + timeout
+    while (file_ref.state is None or file_ref.state.name == "PROCESSING") and time.time() < deadline:
+        time.sleep(delay)
+        delay = min(4.0, delay * 1.5)
+        file_ref = client.files.get(name=file_ref.name)
+    return file_ref
+
+def find_upload(audio_url):
+    """Returns the file an earlier run uploaded for this recording, if Gemini still has it."""
+    name = response_cache.get(upload_key(audio_url))
+    if name is None:
+        return None
+    try:
+        file_ref = client.files.get(name=name)
+    except errors.ClientError:
+        return None  # Uploads are deleted after 48 hours
+    if file_ref.state and file_ref.state.name == "ACTIVE":
+        return file_ref
+    return None
+
+def upload_audio(call):
+    """Downloads a call's audio and uploads it to Gemini.
+
+    Returns the processed file, or None if the audio could not be
+    downloaded or processed.
+    """
+    # 1. Download Audio, 2. Upload to Gemini
+    with session.get(call['url'], stream=True) as resp:
+        if resp.status_code != 200:
+            print(f"Row {call['row']}: Failed to download audio.")
+            return None
+
+        if FFMPEG:
+            # Speech needs far less than the recording's bitrate; a mono
+            # Opus copy is several times smaller to upload and process.
+            print(f"Row {call['row']}: Compressing and uploading to Gemini...")
+            audio = transcode_to_opus(resp)
+            file_ref = client.files.upload(file=audio, config={"mime_type": "audio/ogg"})
+        else:
+            # Buffer the download, in memory unless it is unusually large,
+            # then upload it. (files.upload() only accepts a
+            # SpooledTemporaryFile as a file object from Python 3.11 on.)
+            with tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_SIZE) as audio:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    audio.write(chunk)
+                audio.seek(0)
+
+                print(f"Row {call['row']}: Uploading to Gemini...")
+                file_ref = client.files.upload(file=audio, config={"mime_type": "audio/mpeg"})
+
+    # Wait for processing; small files are often ACTIVE as soon as the
+    # upload finalizes, in which case there is nothing to poll.
+    if file_ref.state is None or file_ref.state.name == "PROCESSING":
+        print(f"Row {call['row']}: Waiting for audio processing...")
+        file_ref = wait_for_file(file_ref)
+
+    state = file_ref.state.name if file_ref.state else "PROCESSING"
+    if state == "FAILED":
+        print(f"Row {call['row']}: Audio processing failed.")
+        return None
+    if state == "PROCESSING":
+        print(f"Row {call['row']}: Audio processing timed out.")
+        return None
 
-def clean_json_text(text):
-    """Cleans AI response to ensure valid JSON."""
-    text = text.replace("```json", "").replace("```", "").strip()
-    # Sometimes AI adds a preamble, find the first '{' and last '}'
-    start = text.find("{")
-    end = text.rfind("}") + 1
-    if start != -1 and end != -1:
-        return text[start:end]
-    return text
+    return file_ref
+
+def analyze_call(call):
+    """Runs a call through Gemini and returns the parsed analysis, including
+    the generated posts for high-scoring calls.
+
+    Gemini is given the audio URL directly; if it can't fetch it, the audio
+    is downloaded and uploaded instead, and later calls go straight to that.
+    An upload made by an earlier run is reused while Gemini still keeps it.
+
+    Returns None if the audio could not be downloaded or processed.
+    """
+    global _direct_urls_ok
+    if _direct_urls_ok:
+        # Let Gemini fetch the recording itself: no download, no upload.
+        print(f"Row {call['row']}: Analyzing from URL...")
+        try:
+            audio = types.Part.from_uri(file_uri=call['url'], mime_type="audio/mpeg")
+            return generate_json([audio], PROMPT_ANALYSIS, Analysis)
+        except errors.ClientError as e:
+            # Only a rejected URL means uploading could help; quota and
+            # model errors would just fail again after the upload.
+            if e.code not in (400, 403):
+                raise
+            print(f"Gemini can't use the audio URL, uploading instead: {e}")
+            _direct_urls_ok = False
+
+    file_ref = find_upload(call['url'])
+    if file_ref:
+        print(f"Row {call['row']}: Reusing earlier upload...")
+    else:
+        file_ref = upload_audio(call)
+        if file_ref is None:
+            return None
+        response_cache.set(upload_key(call['url']), file_ref.name)
+
+    # 3. Analyze Call
+    print(f"Row {call['row']}: Analyzing...")
+    return generate_json([file_ref], PROMPT_ANALYSIS, Analysis)
+
+def process_call_workflow(call):
+    """Runs download -> upload -> analyze (and write posts) for one call.
+
+    Results are kept in `response_cache`, so a call seen before costs nothing.
+
+    Returns (analysis, content) or None if the call had to be skipped.
+    `content` is None when the call did not score high enough for a post.
+    """
+    print(f"Processing Row {call['row']}...")
+
+    key = cache_key(call['url'], PROMPT_ANALYSIS)
+    analysis = response_cache.get(key)
+    if analysis is not None:
+        print(f"Row {call['row']}: Using cached analysis.")
+    else:
+        analysis = analyze_call(call)
+        if analysis is None:
+            return None
+        response_cache.set(key, analysis)
+
+    # 4. Posts come back in the same reply (If Score >= 6)
+    content = None
+    if analysis['score'] >= 6:
+        content = {
+            'hooks': analysis['hooks'],
+            'english_slides': analysis['english_slides'],
+            'tamil_slides': analysis['tamil_slides'],
+        }
+
+    return analysis, content
+
+def result_update(call, analysis):
+    """Builds the Sheets write that marks a call as processed."""
+    return {
+        "range": f"Calls!D{call['row']}:F{call['row']}",
+        "values": [["Processed", analysis.get('score', 0), analysis.get('transcript_summary', '')]]
+    }
+
+def flush_updates(updates):
+    """Writes all buffered row updates in a single batchUpdate request."""
+    if not updates:
+        return
+    service.spreadsheets().values().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"valueInputOption": "RAW", "data": updates}
+    ).execute()
+    updates.clear()
+
+def post_content(analysis, content):
+    """Sends the generated carousel and hooks to Slack."""
+    hooks = "\n".join(f"{i}. {hook}" for i, hook in enumerate(content.get('hooks', []), 1))
+    blocks = [
+        {"type": "header", "text": {"type": "plain_text", "text": "🚀 Viral Content Generated"}},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"*Issue:* {analysis['pain_point']}\n*Score:* {analysis['score']}"}},
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🎣 Hooks:*\n{hooks}"}},
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🇬🇧 English Slides:*\n" + "\n".join(content.get('english_slides', [])) }},
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🇮🇳 Tamil Slides:*\n" + "\n".join(content.get('tamil_slides', [])) }}
+    ]
+    send_slack_msg(blocks)
 
 def main():
     print("--- Starting Bot (New GenAI SDK) ---")
     
     # 0. Test Slack Connection First
     print("Testing Slack connection...")
-    send_slack_msg([{"type": "section", "text": {"type": "mrkdwn", "text": "🤖 *Bot Started Processing...*"}}])
+    threading.Thread(
+        target=post_slack,
+        args=([{"type": "section", "text": {"type": "mrkdwn", "text": "🤖 *Bot Started Processing...*"}}],)
+    ).start()
 
-    target_posts = get_settings()
-    calls = get_pending_calls()
+    target_posts, last_row, calls, last_settled = load_sheet_state()
     print(f"Found {len(calls)} pending calls.")
+    if not calls:
+        bookmark = bookmark_update(calls, set(), last_row, last_settled)
+        if bookmark:
+            flush_updates([bookmark])
+            write_bookmark_hint(bookmark['values'][0][0])
+        return
 
     processed_count = 0
-    
-    for call in calls:
-        if processed_count >= target_posts:
-            break
-            
-        print(f"Processing Row {call['row']}...")
-        tmp_path = None
+    pending_updates = []
+    done_rows = set()
 
+    # Calls are I/O bound (downloads, uploads, Gemini), so run several at once.
+    # Each worker takes its call from start to finish, so while one call is
+    # being analyzed the next ones are already downloading and uploading.
+    # Only a window of MAX_WORKERS calls is in flight; no new calls are
+    # submitted once enough posts have been made. Sheets and Slack are only
+    # touched from this thread, so the shared `service` needs no locking.
+    workers = min(len(calls), MAX_WORKERS)
+    remaining = iter(calls[workers:])
+    unsaved_posts = []  # _slack_queue indices of posts whose rows aren't in the sheet yet
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_call_workflow, call): call for call in calls[:workers]}
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    call = futures.pop(future)
+                    try:
+                        result = future.result()
+                        if result:
+                            analysis, content = result
+                            if content and processed_count >= target_posts:
+                                # Leave it Pending so the next run posts it.
+                                print(f"Post target reached, leaving Row {call['row']} pending.")
+                            else:
+                                # Queue the Sheet write
+                                pending_updates.append(result_update(call, analysis))
+                                done_rows.add(call['row'])
+                                if content:
+                                    unsaved_posts.append(len(_slack_queue))
+                                    post_content(analysis, content)
+                                    print(f"Row {call['row']}: Queued for Slack!")
+                                    processed_count += 1
+                    except Exception as e:
+                        print(f"Error processing row {call['row']}: {e}")
+                        send_slack_msg([{"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ Error processing Row {call['row']}: {str(e)}"}}])
+
+                    if len(pending_updates) >= UPDATE_BATCH_SIZE:
+                        flush_updates(pending_updates)
+                        unsaved_posts.clear()
+
+                    if processed_count < target_posts:
+                        next_call = next(remaining, None)
+                        if next_call:
+                            futures[executor.submit(process_call_workflow, next_call)] = next_call
+    finally:
+        # Save to Sheet and post to Slack, even if the run is cut short
+        bookmark = bookmark_update(calls, done_rows, last_row, last_settled)
+        if bookmark:
+            pending_updates.append(bookmark)
         try:
-            # 1. Download Audio
-            resp = requests.get(call['url'])
-            if resp.status_code != 200:
-                print("Failed to download audio.")
-                continue
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-                tmp.write(resp.content)
-                tmp_path = tmp.name
-
-            # 2. Upload using New SDK (FIXED: uses file= instead of path=)
-            print("Uploading to Gemini...")
-            file_ref = client.files.upload(file=tmp_path)
-            
-            # Wait for processing
-            while file_ref.state.name == "PROCESSING":
-                print("Waiting for audio processing...")
-                time.sleep(2)
-                file_ref = client.files.get(name=file_ref.name)
-            
-            if file_ref.state.name == "FAILED":
-                print("Audio processing failed.")
-                continue
-
-            # 3. Analyze Call
-            print("Analyzing...")
-            prompt_analysis = """
-            I am an Insurance Analyst. Listen to this Tamil sales call.
-            Task 1: Transcribe the key conversation points (Summary Transcript) in English.
-            Task 2: Identify the specific customer pain point.
-            Task 3: Score this call (0-10) on 'Viral Marketing Potential'.
-            
-            Return JSON ONLY: {"transcript_summary": "...", "pain_point": "...", "score": 8}
-            """
-            
-            # Use Flash for analysis
-            response = client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=[file_ref, prompt_analysis]
-            )
-            
-            analysis = json.loads(clean_json_text(response.text))
-
-            # 4. Save to Sheet
-            service.spreadsheets().values().update(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"Calls!D{call['row']}:F{call['row']}",
-                valueInputOption="RAW",
-                body={"values": [["Processed", analysis.get('score', 0), analysis.get('transcript_summary', '')]]}
-            ).execute()
-
-            # 5. Generate Post (If Score >= 6)
-            if analysis.get('score', 0) >= 6:
-                print("Generating Content...")
-                prompt_post = f"""
-                Context: {analysis['pain_point']}
-                Transcript: {analysis['transcript_summary']}
-                
-                Create a Social Media Carousel (3 Slides) in ENGLISH and TAMIL.
-                Also generate 3 different catchy Hooks.
-                
-                Return JSON ONLY: 
-                {{
-                    "hooks": ["Hook1", "Hook2", "Hook3"], 
-                    "english_slides": ["Slide1", "Slide2", "Slide3"], 
-                    "tamil_slides": ["Slide1", "Slide2", "Slide3"]
-                }}
-                """
-                
-                post_resp = client.models.generate_content(
-                    model="gemini-1.5-flash",
-                    contents=[prompt_post]
-                )
-                content = json.loads(clean_json_text(post_resp.text))
-                
-                if content:
-                    # Send to Slack
-                    blocks = [
-                        {"type": "header", "text": {"type": "plain_text", "text": "🚀 Viral Content Generated"}},
-                        {"type": "section", "text": {"type": "mrkdwn", "text": f"*Issue:* {analysis['pain_point']}\n*Score:* {analysis['score']}"}},
-                        {"type": "divider"},
-                        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🎣 Hooks:*\n• " + "\n• ".join(content.get('hooks', [])) }},
-                        {"type": "divider"},
-                        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🇬🇧 English Slides:*\n" + "\n".join(content.get('english_slides', [])) }},
-                        {"type": "divider"},
-                        {"type": "section", "text": {"type": "mrkdwn", "text": f"*🇮🇳 Tamil Slides:*\n" + "\n".join(content.get('tamil_slides', [])) }}
-                    ]
-                    send_slack_msg(blocks)
-                    print("Sent to Slack!")
-                    processed_count += 1
-            
+            flush_updates(pending_updates)
+            if bookmark:
+                write_bookmark_hint(bookmark['values'][0][0])
         except Exception as e:
-            print(f"Error processing row {call['row']}: {e}")
-            send_slack_msg([{"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ Error processing Row {call['row']}: {str(e)}"}}])
-            
-        finally:
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
+            # The unsaved rows stay Pending and the next run posts them again,
+            # so drop their posts instead of posting them twice. Error reports
+            # are kept.
+            print(f"Sheets Error: {e}")
+            for i in reversed(unsaved_posts):
+                del _slack_queue[i]
+            send_slack_msg([{"type": "section", "text": {"type": "mrkdwn", "text": f"⚠️ Could not save results to the sheet: {str(e)}"}}])
+        flush_slack()
+        response_cache.close()
 
 if __name__ == "__main__":
     main()
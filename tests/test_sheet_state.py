@@ -0,0 +1,199 @@
+"""Tests for reading the Settings and Calls sheets and moving the bookmark.
+
+Run with: python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp()
+os.environ.update(
+    GEMINI_API_KEY="test-key",
+    SLACK_WEBHOOK_URL="https://hooks.slack.com/services/test",
+    SPREADSHEET_ID="test-sheet",
+    GOOGLE_CREDS_JSON="{}",
+    RESPONSE_CACHE_PATH=os.path.join(_tmp, "responses"),
+    BOOKMARK_HINT_PATH=os.path.join(_tmp, "bookmark"),
+)
+
+# main creates its Sheets client on import, which needs real credentials.
+with mock.patch("google.oauth2.service_account.Credentials.from_service_account_info"), \
+        mock.patch("googleapiclient.discovery.build"):
+    import main
+
+HEADER = ["id", "url", "duration", "status"]
+
+
+def call_row(n, duration="600", status="Pending"):
+    return [str(n), f"https://audio.example/{n}.mp3", duration, status]
+
+
+class _Request:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+
+class StubSheets:
+    """Serves Settings!B1:B2 and Calls!A{n}:D from in-memory rows, like the Sheets API.
+
+    Ranges that start past `grid_rows` fail the way the real API does.
+    """
+
+    def __init__(self, settings, calls, grid_rows=1000):
+        self.settings = settings
+        self.calls = calls
+        self.grid_rows = grid_rows
+        self.requests = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        self.requests.append(range)
+        return _Request(lambda: self._read(range))
+
+    def batchGet(self, spreadsheetId, ranges):
+        self.requests.append(tuple(ranges))
+        return _Request(lambda: {"valueRanges": [self._read(r) for r in ranges]})
+
+    def _read(self, a1):
+        if a1 == "Settings!B1:B2":
+            return {"values": self.settings} if self.settings else {}
+        start = int(a1[len("Calls!A"):-len(":D")])
+        if start > self.grid_rows:
+            message = f"Range ('Calls'!{a1[6:]}) exceeds grid limits. Max rows: {self.grid_rows}, max columns: 26"
+            raise HttpError(
+                httplib2.Response({"status": 400}),
+                json.dumps({"error": {"code": 400, "message": message, "status": "INVALID_ARGUMENT"}}).encode()
+            )
+        rows = self.calls[start - 1:]
+        return {"values": rows} if rows else {}
+
+
+class ParseSettingsTest(unittest.TestCase):
+    def test_defaults_when_blank(self):
+        self.assertEqual(main.parse_settings([]), (2, 0))
+
+    def test_reads_both_cells(self):
+        self.assertEqual(main.parse_settings([["3"], ["40"]]), (3, 40))
+
+    def test_each_cell_falls_back_on_its_own(self):
+        self.assertEqual(main.parse_settings([["lots"], ["40"]]), (2, 40))
+        self.assertEqual(main.parse_settings([[], ["40"]]), (2, 40))
+        self.assertEqual(main.parse_settings([["5"]]), (5, 0))
+        self.assertEqual(main.parse_settings([["5"], ["x"]]), (5, 0))
+
+
+class FirstOpenRowTest(unittest.TestCase):
+    def test_settled_rows(self):
+        rows = [HEADER, call_row(2, status="Processed"), call_row(3, duration="100"), call_row(4)]
+        self.assertIsNone(main.first_open_row(rows))
+
+    def test_blank_status_is_open(self):
+        rows = [HEADER, call_row(2, status="Processed"), call_row(3, status=""), call_row(4, status="Processed")]
+        self.assertEqual(main.first_open_row(rows), 3)
+        self.assertEqual(main.first_open_row([call_row(7)[:3]], first_row=7), 7)
+        self.assertEqual(main.first_open_row([[]], first_row=7), 7)
+
+    def test_pending_without_duration_is_open(self):
+        self.assertEqual(main.first_open_row([call_row(5, duration="")], first_row=5), 5)
+
+
+class BookmarkUpdateTest(unittest.TestCase):
+    def test_moves_to_last_settled_row_when_all_done(self):
+        calls = [{"row": 5, "url": "a"}, {"row": 8, "url": "b"}]
+        self.assertEqual(main.bookmark_update(calls, {5, 8}, 1, 20), {"range": "Settings!B2", "values": [[20]]})
+        self.assertEqual(main.bookmark_update([], set(), 1, 20)["values"], [[20]])
+
+    def test_stops_before_first_unfinished_call(self):
+        calls = [{"row": 5, "url": "a"}, {"row": 8, "url": "b"}, {"row": 9, "url": "c"}]
+        self.assertEqual(main.bookmark_update(calls, {5, 9}, 1, 20)["values"], [[7]])
+
+    def test_never_passes_last_settled_row(self):
+        calls = [{"row": 12, "url": "a"}]
+        self.assertEqual(main.bookmark_update(calls, set(), 1, 6)["values"], [[6]])
+
+    def test_none_when_bookmark_would_not_move(self):
+        calls = [{"row": 5, "url": "a"}]
+        self.assertIsNone(main.bookmark_update(calls, set(), 4, 20))
+        self.assertIsNone(main.bookmark_update([], set(), 9, 6))
+
+
+class LoadSheetStateTest(unittest.TestCase):
+    def load(self, stub, hint):
+        with mock.patch.object(main, "service", stub), \
+                mock.patch.object(main, "read_bookmark_hint", return_value=hint):
+            return main.load_sheet_state()
+
+    def test_single_batch_get_from_hint(self):
+        calls = [HEADER, call_row(2, status="Processed"), call_row(3), call_row(4, duration="100"), call_row(5)]
+        stub = StubSheets([["3"], ["2"]], calls)
+        target_posts, last_row, pending, last_settled = self.load(stub, hint=2)
+        self.assertEqual((target_posts, last_row, last_settled), (3, 2, 5))
+        self.assertEqual([c["row"] for c in pending], [3, 5])
+        self.assertEqual(pending[0]["url"], "https://audio.example/3.mp3")
+        self.assertEqual(stub.requests, [("Settings!B1:B2", "Calls!A3:D")])
+
+    def test_rows_behind_bookmark_are_dropped(self):
+        calls = [HEADER, call_row(2), call_row(3), call_row(4, status=""), call_row(5)]
+        stub = StubSheets([["2"], ["4"]], calls)
+        _, last_row, pending, last_settled = self.load(stub, hint=1)
+        self.assertEqual(last_row, 4)
+        self.assertEqual([c["row"] for c in pending], [5])
+        self.assertEqual(last_settled, 5)
+
+    def test_open_row_holds_back_last_settled(self):
+        calls = [HEADER, call_row(2, status="Processed"), call_row(3, status=""), call_row(4, status="Processed"),
+                 call_row(5)]
+        stub = StubSheets([["2"], ["1"]], calls)
+        _, _, pending, last_settled = self.load(stub, hint=1)
+        self.assertEqual(last_settled, 2)
+        self.assertEqual([c["row"] for c in pending], [5])
+
+    def test_refetches_when_bookmark_was_reset(self):
+        calls = [HEADER, call_row(2), call_row(3, status="Processed"), call_row(4)]
+        stub = StubSheets([["2"], [""]], calls)
+        _, last_row, pending, last_settled = self.load(stub, hint=3)
+        self.assertEqual(last_row, 0)
+        self.assertEqual([c["row"] for c in pending], [2, 4])
+        self.assertEqual(last_settled, 4)
+        self.assertEqual(stub.requests, [("Settings!B1:B2", "Calls!A4:D"), "Calls!A1:D"])
+
+    def test_hint_at_last_grid_row(self):
+        calls = [HEADER, call_row(2, status="Processed"), call_row(3, status="Processed")]
+        stub = StubSheets([["2"], ["3"]], calls, grid_rows=3)
+        _, last_row, pending, last_settled = self.load(stub, hint=3)
+        self.assertEqual((last_row, pending, last_settled), (3, [], 3))
+        self.assertEqual(stub.requests, [("Settings!B1:B2", "Calls!A4:D"), "Settings!B1:B2"])
+
+    def test_hint_past_grid_with_bookmark_reset(self):
+        calls = [HEADER, call_row(2), call_row(3, status="Processed")]
+        stub = StubSheets([["2"], ["1"]], calls, grid_rows=3)
+        _, last_row, pending, last_settled = self.load(stub, hint=3)
+        self.assertEqual([c["row"] for c in pending], [2])
+        self.assertEqual(last_settled, 3)
+
+    def test_other_http_errors_are_raised(self):
+        stub = StubSheets([["2"], ["1"]], [HEADER])
+        error = HttpError(httplib2.Response({"status": 403}), b'{"error": {"message": "denied"}}')
+        with mock.patch.object(stub, "batchGet", side_effect=error):
+            with self.assertRaises(HttpError):
+                self.load(stub, hint=1)
+
+
+if __name__ == "__main__":
+    unittest.main()